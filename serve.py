@@ -0,0 +1,15 @@
+import os
+import sys
+
+from streamlit.web import cli as stcli
+
+from warmup import YEARS, start_warmup
+
+# Jalankan aplikasi dengan `python serve.py` (argumen tambahan diteruskan ke `streamlit run`).
+# Warm-up dimulai di proses server sebelum server menerima request, sehingga
+# warmup_status.json menjadi "ready" tanpa menunggu pengunjung pertama.
+if __name__ == '__main__':
+    start_warmup(YEARS)
+    app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'streamlit_app.py')
+    sys.argv = ['streamlit', 'run', app_path, *sys.argv[1:]]
+    sys.exit(stcli.main())
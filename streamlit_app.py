@@ -1,7 +1,16 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+import pyarrow as pa
+import pyarrow.parquet as pq
+import os
+import re
+import threading
+import time
+import uuid
 from datetime import datetime
+from openpyxl import Workbook
+from warmup import YEARS, start_warmup
 
 # Set page configuration
 st.set_page_config(
@@ -12,62 +21,169 @@ st.set_page_config(
 )
 
 # =====================================
-# Fungsi untuk Memuat dan Menggabungkan Data dari Beberapa Tahun
+# Fungsi Filter Sidebar
 # =====================================
 
-@st.cache_data
-def load_data(years, file_template='{}_db.xlsx', sheet_name='Sheet1'):
-    df_list = []
-    for year in years:
-        file_path = file_template.format(year)
-        try:
-            df = pd.read_excel(file_path, sheet_name=sheet_name)
-            df['year'] = year  # Menambahkan kolom tahun
-            df_list.append(df)
-        except FileNotFoundError:
-            st.error(f"File untuk tahun {year} tidak ditemukan: {file_path}")
-        except Exception as e:
-            st.error(f"Terjadi kesalahan saat memuat file {file_path}: {e}")
-    if df_list:
-        combined_df = pd.concat(df_list, ignore_index=True)
-        return combined_df
-    else:
-        st.stop()
+def apply_filters(df, selected_year, selected_months, selected_nm_div, selected_anm_div, selected_subdivisi):
+    # Dipakai untuk data mentah (export) maupun agregat bulanan (tabel dan grafik)
+    filtered_df = df[
+        ((selected_nm_div == 'Semua Divisi') | (df['nm_div'] == selected_nm_div)) &
+        (df['anm_div'].isin(selected_anm_div)) &
+        (df['subdivisi'].isin(selected_subdivisi))
+    ]
+
+    # Filter berdasarkan tahun jika bukan "All Years"
+    if selected_year != 'All Years':
+        filtered_df = filtered_df[filtered_df['year'] == selected_year]
+
+    # Filter berdasarkan bulan jika bukan "All Months"
+    if 'All Months' not in selected_months and selected_months:
+        filtered_df = filtered_df[filtered_df['month_year'].isin(selected_months)]
+    # Jika "All Months" dipilih atau tidak memilih apapun, tidak ada filter bulan
 
-# Daftar tahun yang akan dimuat
-years = [2020, 2021, 2022, 2023, 2024]
-data = load_data(years)
+    return filtered_df
 
-# Rename columns sesuai kebutuhan
-data.rename(columns={
-    'nama divisi': 'nm_div',
-    'divisi': 'anm_div',
-    'sub divisi': 'subdivisi'
-}, inplace=True)
+# =====================================
+# Fungsi untuk Export Data secara Bertahap (Chunked)
+# =====================================
+
+# Jumlah baris per chunk saat export
+EXPORT_CHUNK_ROWS = 50000
 
-# Convert 'tanggal' to datetime
-data['tanggal'] = pd.to_datetime(data['tanggal'], format='%d/%m/%Y', errors='coerce')
+# File export disimpan di folder static agar diunduh langsung dari disk
+# (butuh server.enableStaticServing = true di .streamlit/config.toml)
+EXPORT_DIR = os.path.join('static', 'exports')
+EXPORT_URL_PREFIX = 'app/static/exports'
 
-# Menghapus baris dengan tanggal yang tidak valid
-data = data.dropna(subset=['tanggal'])
+# File export lama dihapus setelah 1 jam
+EXPORT_MAX_AGE_SECONDS = 3600
 
-# Tambahkan kolom 'month_year' untuk agregasi per bulan
-months = ['Januari', 'Februari', 'Maret', 'April', 'Mei', 'Juni',
-          'Juli', 'Agustus', 'September', 'Oktober', 'November', 'Desember']
+# Batas ukuran file yang mau dilayani oleh static file server Streamlit
+EXPORT_MAX_FILE_BYTES = 200 * 1024 * 1024
 
-bulan_dict = {
-    'Januari':1, 'Februari':2, 'Maret':3, 'April':4,
-    'Mei':5, 'Juni':6, 'Juli':7, 'Agustus':8,
-    'September':9, 'Oktober':10, 'November':11, 'Desember':12
+# Format export: ekstensi file
+EXPORT_FORMATS = {
+    'CSV': 'csv',
+    'Parquet': 'parquet',
+    'XLSX': 'xlsx'
 }
 
-data['month_year'] = data['tanggal'].apply(lambda x: f"{months[x.month - 1]} {x.year}")
+def iter_chunks(df, chunk_rows=EXPORT_CHUNK_ROWS):
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+def write_export(df, export_format, file_path, chunk_rows=EXPORT_CHUNK_ROWS):
+    # Setiap chunk langsung ditulis ke file tujuan, sehingga output tidak pernah ditampung utuh di memori
+    if export_format == 'CSV':
+        with open(file_path, 'w', encoding='utf-8', newline='') as f:
+            if df.empty:
+                df.to_csv(f, index=False)
+            for idx, chunk in enumerate(iter_chunks(df, chunk_rows)):
+                chunk.to_csv(f, index=False, header=(idx == 0))
+    elif export_format == 'Parquet':
+        # Kolom object (campuran angka/teks) dijadikan string agar skema konsisten
+        string_columns = {col: 'string' for col in df.columns if df[col].dtype == object}
+        schema = pa.Schema.from_pandas(df.head(0).astype(string_columns), preserve_index=False)
+        with pq.ParquetWriter(file_path, schema) as writer:
+            for chunk in iter_chunks(df, chunk_rows):
+                writer.write_table(pa.Table.from_pandas(chunk.astype(string_columns), schema=schema, preserve_index=False))
+    elif export_format == 'XLSX':
+        workbook = Workbook(write_only=True)
+        worksheet = workbook.create_sheet(title='Data')
+        worksheet.append([str(col) for col in df.columns])
+        for chunk in iter_chunks(df, chunk_rows):
+            chunk = chunk.astype(object).where(chunk.notna(), None)
+            for row in chunk.itertuples(index=False, name=None):
+                worksheet.append(list(row))
+        workbook.save(file_path)
+    else:
+        raise ValueError(f"Format export tidak dikenal: {export_format}")
+
+def remove_old_exports():
+    if not os.path.isdir(EXPORT_DIR):
+        return
+    now = time.time()
+    for file_name in os.listdir(EXPORT_DIR):
+        file_path = os.path.join(EXPORT_DIR, file_name)
+        if file_name != '.gitkeep' and now - os.path.getmtime(file_path) > EXPORT_MAX_AGE_SECONDS:
+            os.remove(file_path)
+
+def build_export_tables(base_data, nomor_barang_list):
+    # Satu kali pass untuk semua nomor barang: satu mask gabungan, lalu groupby per item
+    pattern = '|'.join(re.escape(nomor) for nomor in nomor_barang_list)
+    rows = base_data[base_data['nomor barang'].str.contains(pattern, case=False, na=False)]
+
+    # Nomor bulan ikut di-groupby agar urutan bulan sesuai kalender, bukan alfabet
+    monthly_data = rows.groupby(
+        ['nomor barang', 'year', rows['tanggal'].dt.month.rename('bulan'), 'month_year', 'anm_div', 'subdivisi']
+    )['jumlah'].sum().reset_index().drop(columns='bulan')
+
+    return {
+        'Data Transaksi': rows,
+        'Pemakaian Tahunan': rows.groupby(['nomor barang', 'year'])['jumlah'].sum().reset_index(),
+        'Pemakaian Bulanan per Divisi': monthly_data
+    }
+
+def run_export_job(job, data, filter_args, nomor_barang_list, export_dataset, export_format):
+    # Dijalankan di worker thread; status disimpan di dict job (tanpa pemanggilan st.*)
+    try:
+        base_data = apply_filters(data, *filter_args)
+        export_df = build_export_tables(base_data, nomor_barang_list)[export_dataset]
+        file_path = os.path.join(EXPORT_DIR, job['file_name'])
+        tmp_path = file_path + '.tmp'
+        write_export(export_df, export_format, tmp_path)
+        if os.path.getsize(tmp_path) > EXPORT_MAX_FILE_BYTES:
+            os.remove(tmp_path)
+            raise ValueError(
+                f"Ukuran file melebihi batas {EXPORT_MAX_FILE_BYTES // (1024 * 1024)} MB, "
+                "silakan persempit filter atau kurangi jumlah nomor barang."
+            )
+        os.replace(tmp_path, file_path)
+        job['rows'] = len(export_df)
+        job['status'] = 'done'
+    except Exception as e:
+        job['error'] = str(e)
+        job['status'] = 'error'
+
+# Warm-up berjalan di background (dimulai oleh serve.py saat server start,
+# atau oleh sesi pertama jika aplikasi dijalankan dengan `streamlit run`)
+warmup = start_warmup(YEARS)
 
 # Sidebar
 st.sidebar.image("654db0b264142 (1).webp", width=120)
 st.sidebar.title("📊 PT Bakrie Pipe Industries")
 st.sidebar.subheader("Dashboard Visualisasi Data Barang Keluar")
 
+for error in warmup.errors:
+    st.error(error)
+
+# Tampilkan indikator loading selama warm-up belum selesai, lalu cek ulang
+if warmup.status != 'ready':
+    st.sidebar.progress(warmup.progress, text=f"⏳ {warmup.message}")
+    if warmup.status == 'error':
+        st.error(f"Data gagal dimuat: {warmup.message}")
+    else:
+        st.info("⏳ Data sedang disiapkan, dashboard akan tampil otomatis setelah selesai.")
+    time.sleep(1)
+    st.rerun()
+
+data = warmup.result['data']
+quarantine_data = warmup.result['quarantine_data']
+name_variant_data = warmup.result['name_variant_data']
+monthly_data = warmup.result['monthly_data']
+
+# Ringkasan baris yang dikarantina saat validasi
+if not quarantine_data.empty:
+    with st.sidebar.expander(f"⚠️ Data Karantina ({len(quarantine_data)} baris)"):
+        quarantine_summary = quarantine_data.groupby(['file', 'alasan']).size().reset_index(name='jumlah baris')
+        st.table(quarantine_summary)
+        st.dataframe(quarantine_data)
+
+# Nomor barang dengan lebih dari satu nama barang (tetap dihitung, hanya peringatan)
+if not name_variant_data.empty:
+    with st.sidebar.expander(f"ℹ️ Variasi Nama Barang ({name_variant_data['jumlah baris'].sum()} baris)"):
+        st.dataframe(name_variant_data)
+
 # =====================================
 # Pindahkan Pencarian Nomor Barang ke Sidebar
 # =====================================
@@ -100,9 +216,7 @@ font_color = "#000000" if mode == "Light" else "#ffffff"
 # ============================
 
 # Definisikan daftar tahun
-unique_years = data['year'].unique()
-sorted_years = sorted(unique_years)
-year_options = ['All Years'] + list(sorted_years)
+year_options = warmup.result['year_options']
 
 # Dropdown untuk memilih tahun
 selected_year = st.sidebar.selectbox(
@@ -111,14 +225,7 @@ selected_year = st.sidebar.selectbox(
 )
 
 # Definisikan daftar bulan per tahun
-if selected_year != 'All Years':
-    # Filter data berdasarkan tahun yang dipilih
-    data_filtered_year = data[data['year'] == selected_year]
-else:
-    data_filtered_year = data.copy()
-
-unique_month_year = data_filtered_year['month_year'].unique()
-sorted_month_year = sorted(unique_month_year, key=lambda x: (int(x.split()[1]), bulan_dict[x.split()[0]]))
+sorted_month_year = warmup.result['month_year_by_year'][selected_year]
 month_year_options = ['All Months'] + sorted_month_year
 
 # Multiselect untuk memilih bulan
@@ -129,26 +236,25 @@ selected_months = st.sidebar.multiselect(
 )
 
 # nm_div filter
-nm_div_options = ['Semua Divisi'] + list(data['nm_div'].dropna().unique())
+nm_div_options = warmup.result['nm_div_options']
 selected_nm_div = st.sidebar.selectbox(
     "Pilih Nama Divisi:",
     options=nm_div_options
 )
 
 # anm_div and subdivisi filters (depend on selected nm_div)
-if selected_nm_div == 'Semua Divisi':
-    filtered_nm_div_data = data
-else:
-    filtered_nm_div_data = data[data['nm_div'] == selected_nm_div]
+division_data = warmup.result['division_data']
+if selected_nm_div != 'Semua Divisi':
+    division_data = division_data[division_data['nm_div'] == selected_nm_div]
 
-anm_div_options = filtered_nm_div_data['anm_div'].dropna().unique()
+anm_div_options = warmup.result['anm_div_by_nm_div'][selected_nm_div]
 selected_anm_div = st.sidebar.multiselect(
     "Alokasi Nama Divisi:",
     options=anm_div_options,
     default=list(anm_div_options)
 )
 
-subdivisi_options = filtered_nm_div_data[filtered_nm_div_data['anm_div'].isin(selected_anm_div)]['subdivisi'].dropna().unique()
+subdivisi_options = division_data[division_data['anm_div'].isin(selected_anm_div)]['subdivisi'].dropna().unique()
 selected_subdivisi = st.sidebar.multiselect(
     "Pilih Sub Divisi:",
     options=subdivisi_options,
@@ -378,21 +484,9 @@ else:
     </div>
     """, unsafe_allow_html=True)
 
-    # Apply filters
-    filtered_data = data[
-        ((selected_nm_div == 'Semua Divisi') | (data['nm_div'] == selected_nm_div)) &
-        (data['anm_div'].isin(selected_anm_div)) &
-        (data['subdivisi'].isin(selected_subdivisi))
-    ]
-
-    # Filter berdasarkan tahun jika bukan "All Years"
-    if selected_year != 'All Years':
-        filtered_data = filtered_data[filtered_data['year'] == selected_year]
-
-    # Filter berdasarkan bulan jika bukan "All Months"
-    if 'All Months' not in selected_months and selected_months:
-        filtered_data = filtered_data[filtered_data['month_year'].isin(selected_months)]
-    # Jika "All Months" dipilih atau tidak memilih apapun, tidak ada filter bulan
+    # Apply filters (pada agregat bulanan hasil warm-up, bukan data mentah)
+    filter_args = (selected_year, selected_months, selected_nm_div, selected_anm_div, selected_subdivisi)
+    filtered_data = apply_filters(monthly_data, *filter_args)
 
     # Filter berdasarkan nomor barang
     filtered_nomor_barang_data = filtered_data[filtered_data['nomor barang'].str.contains(masukkan_nomor_barang, case=False, na=False)]
@@ -423,6 +517,64 @@ else:
     # Tampilkan tabel total tahunan
     st.table(usage_data)
 
+    # ========================================
+    # Export Data (CSV / Parquet / XLSX)
+    # ========================================
+
+    with st.expander("📥 Export Data"):
+        export_nomor_barang = st.text_input(
+            "Nomor Barang untuk Export (pisahkan dengan koma):",
+            value=masukkan_nomor_barang
+        )
+        export_dataset = st.selectbox(
+            "Pilih Data:",
+            options=['Data Transaksi', 'Pemakaian Tahunan', 'Pemakaian Bulanan per Divisi']
+        )
+        export_format = st.selectbox(
+            "Pilih Format:",
+            options=list(EXPORT_FORMATS)
+        )
+
+        # File dibuat di worker thread saat tombol diklik, bukan di setiap rerun
+        if st.button("Siapkan File Export"):
+            nomor_barang_list = [nomor.strip() for nomor in export_nomor_barang.split(',') if nomor.strip()]
+            if not nomor_barang_list:
+                st.error("Silakan masukkan minimal satu Nomor Barang untuk export.")
+            else:
+                remove_old_exports()
+                os.makedirs(EXPORT_DIR, exist_ok=True)
+                extension = EXPORT_FORMATS[export_format]
+                export_job = {
+                    'status': 'running',
+                    'file_name': f"{uuid.uuid4().hex}.{extension}",
+                    'download_name': f"{export_dataset.lower().replace(' ', '_')}.{extension}",
+                    'label': f"{export_dataset} ({export_format})",
+                    'item_count': len(nomor_barang_list),
+                    'rows': None,
+                    'error': None
+                }
+                threading.Thread(
+                    target=run_export_job,
+                    args=(export_job, data, filter_args, nomor_barang_list, export_dataset, export_format),
+                    name='export',
+                    daemon=True
+                ).start()
+                st.session_state['export_job'] = export_job
+
+        export_job = st.session_state.get('export_job')
+        if export_job is not None:
+            if export_job['status'] == 'running':
+                st.info(f"⏳ File {export_job['label']} sedang disiapkan...")
+                st.button("🔄 Cek Status Export")
+            elif export_job['status'] == 'error':
+                st.error(f"Export gagal: {export_job['error']}")
+            else:
+                st.markdown(
+                    f"""<a href="{EXPORT_URL_PREFIX}/{export_job['file_name']}" download="{export_job['download_name']}">⬇️ Download {export_job['label']}</a>""",
+                    unsafe_allow_html=True
+                )
+                st.caption(f"{export_job['rows']} baris untuk {export_job['item_count']} nomor barang.")
+
     # ========================================
     # Visualisasi Data
     # ========================================
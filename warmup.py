@@ -0,0 +1,304 @@
+import pandas as pd
+import numpy as np
+import glob
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+# Daftar tahun yang akan dimuat
+YEARS = [2020, 2021, 2022, 2023, 2024]
+
+# =====================================
+# Validasi dan Karantina Data per File
+# =====================================
+
+# Folder cache hasil validasi (satu file cache per versi file Excel)
+VALIDATION_CACHE_DIR = '.validation_cache'
+
+# Naikkan versi ini setiap kali aturan di validate_partition berubah,
+# agar cache hasil validasi lama tidak dipakai lagi
+VALIDATION_RULES_VERSION = 2
+
+def dominant_value(values, keys):
+    # Nilai yang paling sering muncul untuk tiap key
+    counts = values.groupby(keys).value_counts().reset_index()
+    return (
+        counts.sort_values('count', ascending=False, kind='stable')
+        .drop_duplicates(keys.name)
+        .set_index(keys.name)[values.name]
+    )
+
+def validate_partition(df, file_path):
+    # Parsing kolom sekali untuk seluruh partisi
+    tanggal = pd.to_datetime(df['tanggal'], format='%d/%m/%Y', errors='coerce')
+    jumlah = pd.to_numeric(df['jumlah'], errors='coerce')
+    nomor_barang_kosong = df['nomor barang'].isna() | df['nomor barang'].astype(str).str.strip().eq('')
+
+    # Satuan yang paling sering muncul dianggap benar untuk tiap nomor barang;
+    # satuan yang berbeda membuat penjumlahan 'jumlah' tidak valid
+    satuan = df['satuan'].astype(str).str.strip().str.upper()
+    satuan_dominan = df['nomor barang'].map(dominant_value(satuan, df['nomor barang']))
+    satuan_tidak_konsisten = ~nomor_barang_kosong & satuan.ne(satuan_dominan)
+
+    rules = {
+        'tanggal tidak valid': tanggal.isna(),
+        'jumlah bukan angka': jumlah.isna(),
+        'jumlah negatif': jumlah < 0,
+        'nomor barang kosong': nomor_barang_kosong,
+        'satuan tidak konsisten': satuan_tidak_konsisten
+    }
+
+    # Gabungkan alasan penolakan per baris
+    alasan = pd.Series('', index=df.index)
+    for reason, mask in rules.items():
+        alasan = alasan + np.where(mask, reason + '; ', '')
+    alasan = alasan.str.rstrip('; ')
+    rejected = alasan.ne('')
+
+    clean_df = df[~rejected].copy()
+    clean_df['tanggal'] = tanggal[~rejected]
+    clean_df['jumlah'] = jumlah[~rejected]
+
+    quarantine_df = df[rejected].copy()
+    quarantine_df['file'] = file_path
+    quarantine_df['alasan'] = alasan[rejected]
+
+    # Variasi nama barang tidak ditolak (jumlah tetap dihitung), hanya dicatat sebagai peringatan
+    nama_barang = clean_df['nama barang'].astype(str)
+    nama_barang_dominan = clean_df['nomor barang'].map(dominant_value(nama_barang, clean_df['nomor barang']))
+    variasi = nama_barang.ne(nama_barang_dominan)
+    name_variant_df = (
+        pd.DataFrame({
+            'file': file_path,
+            'nomor barang': clean_df['nomor barang'][variasi],
+            'nama barang': nama_barang[variasi],
+            'nama barang dominan': nama_barang_dominan[variasi]
+        })
+        .groupby(['file', 'nomor barang', 'nama barang', 'nama barang dominan'])
+        .size()
+        .reset_index(name='jumlah baris')
+    )
+
+    return clean_df, quarantine_df, name_variant_df
+
+def load_partition(file_path, year, sheet_name='Sheet1'):
+    # Kunci cache berdasarkan versi aturan validasi, waktu modifikasi dan ukuran file,
+    # sehingga validasi hanya dijalankan ulang jika file atau aturannya berubah
+    stat = os.stat(file_path)
+    cache_prefix = os.path.join(VALIDATION_CACHE_DIR, f"{os.path.basename(file_path)}.{sheet_name}.")
+    cache_path = f"{cache_prefix}v{VALIDATION_RULES_VERSION}.{stat.st_mtime_ns}.{stat.st_size}.pkl"
+
+    if os.path.exists(cache_path):
+        return pd.read_pickle(cache_path)
+
+    df = pd.read_excel(file_path, sheet_name=sheet_name)
+    df['year'] = year  # Menambahkan kolom tahun
+    partition = validate_partition(df, file_path)
+
+    # Hapus cache versi lama dari file yang sama
+    os.makedirs(VALIDATION_CACHE_DIR, exist_ok=True)
+    for stale_path in glob.glob(glob.escape(cache_prefix) + '*.pkl'):
+        os.remove(stale_path)
+
+    # Tulis ke file sementara lalu rename agar proses lain tidak membaca pickle setengah jadi
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    pd.to_pickle(partition, tmp_path)
+    os.replace(tmp_path, cache_path)
+
+    return partition
+
+# =====================================
+# Fungsi untuk Memuat dan Menggabungkan Data dari Beberapa Tahun
+# =====================================
+
+# Nama bulan untuk kolom 'month_year'
+months = ['Januari', 'Februari', 'Maret', 'April', 'Mei', 'Juni',
+          'Juli', 'Agustus', 'September', 'Oktober', 'November', 'Desember']
+
+bulan_dict = {
+    'Januari':1, 'Februari':2, 'Maret':3, 'April':4,
+    'Mei':5, 'Juni':6, 'Juli':7, 'Agustus':8,
+    'September':9, 'Oktober':10, 'November':11, 'Desember':12
+}
+
+def load_data(years, file_template='{}_db.xlsx', sheet_name='Sheet1', on_progress=None):
+    # Error dikumpulkan (bukan st.error) karena fungsi ini dijalankan di thread warm-up
+    df_list = []
+    quarantine_list = []
+    name_variant_list = []
+    errors = []
+    for idx, year in enumerate(years):
+        file_path = file_template.format(year)
+        try:
+            df, quarantine_df, name_variant_df = load_partition(file_path, year, sheet_name=sheet_name)
+            df_list.append(df)
+            quarantine_list.append(quarantine_df)
+            name_variant_list.append(name_variant_df)
+        except FileNotFoundError:
+            errors.append(f"File untuk tahun {year} tidak ditemukan: {file_path}")
+        except Exception as e:
+            errors.append(f"Terjadi kesalahan saat memuat file {file_path}: {e}")
+        if on_progress is not None:
+            on_progress((idx + 1) / len(years), f"Memuat file {file_path}")
+    if df_list:
+        combined_df = pd.concat(df_list, ignore_index=True)
+        quarantine_data = pd.concat(quarantine_list, ignore_index=True)
+        name_variant_data = pd.concat(name_variant_list, ignore_index=True)
+        return combined_df, quarantine_data, name_variant_data, errors
+    else:
+        return None, None, None, errors
+
+def prepare_data(data):
+    # Rename columns sesuai kebutuhan
+    data = data.rename(columns={
+        'nama divisi': 'nm_div',
+        'divisi': 'anm_div',
+        'sub divisi': 'subdivisi'
+    })
+
+    # Kolom 'tanggal' sudah dikonversi ke datetime dan baris tidak valid
+    # sudah dipindahkan ke quarantine_data saat validasi per file
+
+    # Tambahkan kolom 'month_year' untuk agregasi per bulan
+    data['month_year'] = (
+        data['tanggal'].dt.month.map(dict(enumerate(months, start=1)))
+        + ' ' + data['tanggal'].dt.year.astype(str)
+    )
+    return data
+
+def build_filter_options(data):
+    # Daftar tahun
+    sorted_years = sorted(data['year'].unique())
+
+    # Daftar bulan per tahun (termasuk 'All Years')
+    def sort_month_year(values):
+        return sorted(values, key=lambda x: (int(x.split()[1]), bulan_dict[x.split()[0]]))
+
+    month_year_by_year = {'All Years': sort_month_year(data['month_year'].unique())}
+    for year, month_year_values in data.groupby('year')['month_year'].unique().items():
+        month_year_by_year[year] = sort_month_year(month_year_values)
+
+    # Daftar alokasi nama divisi per nama divisi (termasuk 'Semua Divisi')
+    nm_div_values = list(data['nm_div'].dropna().unique())
+    anm_div_by_nm_div = {'Semua Divisi': data['anm_div'].dropna().unique()}
+    for nm_div, anm_div_values in data.dropna(subset=['nm_div']).groupby('nm_div')['anm_div'].unique().items():
+        anm_div_by_nm_div[nm_div] = pd.Series(anm_div_values).dropna().unique()
+
+    return {
+        'year_options': ['All Years'] + list(sorted_years),
+        'month_year_by_year': month_year_by_year,
+        'nm_div_options': ['Semua Divisi'] + nm_div_values,
+        'anm_div_by_nm_div': anm_div_by_nm_div
+    }
+
+def build_aggregates(data):
+    # Agregat bulanan pada level terkecil yang dipakai filter dan grafik,
+    # sehingga grafik tidak perlu meng-groupby data mentah di setiap rerun
+    monthly_data = data.groupby(
+        ['nomor barang', 'nama barang', 'satuan', 'nm_div', 'anm_div', 'subdivisi', 'year', 'month_year'],
+        dropna=False,
+        sort=False
+    )['jumlah'].sum().reset_index()
+
+    # Kombinasi divisi yang ada, untuk opsi filter sub divisi
+    division_data = data[['nm_div', 'anm_div', 'subdivisi']].drop_duplicates()
+
+    return {
+        'monthly_data': monthly_data,
+        'division_data': division_data
+    }
+
+# =====================================
+# Warm-up Data di Background
+# =====================================
+
+# File status warm-up yang dapat dipantau oleh load balancer
+WARMUP_STATUS_FILE = 'warmup_status.json'
+
+# Jeda sebelum warm-up yang gagal dicoba lagi
+WARMUP_RETRY_SECONDS = 30
+
+class WarmupState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.status = 'starting'
+        self.progress = 0.0
+        self.message = 'Menunggu warm-up dimulai'
+        self.errors = []
+        self.result = None
+
+    def update(self, status, progress, message):
+        with self.lock:
+            self.status = status
+            self.progress = progress
+            self.message = message
+            snapshot = {
+                'status': status,
+                'ready': status == 'ready',
+                'progress': round(progress, 2),
+                'message': message,
+                'errors': list(self.errors),
+                'updated_at': datetime.now().isoformat(timespec='seconds')
+            }
+        write_warmup_status(snapshot)
+
+def write_warmup_status(snapshot):
+    # Tulis ke file sementara lalu rename agar pembaca tidak melihat file setengah jadi
+    tmp_path = WARMUP_STATUS_FILE + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, WARMUP_STATUS_FILE)
+
+def run_warmup(state, years):
+    # Jika gagal (misalnya file sedang tidak bisa dibaca), warm-up dicoba lagi secara berkala
+    while True:
+        state.errors = []
+        try:
+            state.update('loading', 0.0, 'Memuat data')
+            data, quarantine_data, name_variant_data, errors = load_data(
+                years,
+                on_progress=lambda progress, message: state.update('loading', 0.7 * progress, message)
+            )
+            state.errors = errors
+            if data is not None:
+                state.update('loading', 0.75, 'Menyiapkan kolom bulan dan tahun')
+                data = prepare_data(data)
+
+                state.update('loading', 0.8, 'Menyiapkan opsi filter')
+                options = build_filter_options(data)
+
+                state.update('loading', 0.9, 'Menyiapkan agregat bulanan')
+                aggregates = build_aggregates(data)
+
+                state.result = {
+                    'data': data,
+                    'quarantine_data': quarantine_data,
+                    'name_variant_data': name_variant_data,
+                    **options,
+                    **aggregates
+                }
+                state.update('ready', 1.0, 'Data siap')
+                return
+            message = 'Tidak ada data yang berhasil dimuat'
+        except Exception as e:
+            state.errors.append(f"Terjadi kesalahan saat warm-up: {e}")
+            message = str(e)
+        state.update('error', 1.0, f"{message} (dicoba lagi dalam {WARMUP_RETRY_SECONDS} detik)")
+        time.sleep(WARMUP_RETRY_SECONDS)
+
+# State warm-up dibuat sekali per proses server dan dipakai bersama oleh semua sesi
+_warmup_state = None
+_warmup_lock = threading.Lock()
+
+def start_warmup(years=YEARS):
+    # Aman dipanggil berkali-kali: thread warm-up hanya dijalankan sekali per proses
+    global _warmup_state
+    with _warmup_lock:
+        if _warmup_state is None:
+            _warmup_state = WarmupState()
+            # Timpa status dari proses sebelumnya agar tidak terbaca "ready" sebelum data dimuat
+            _warmup_state.update('starting', 0.0, 'Menunggu warm-up dimulai')
+            threading.Thread(target=run_warmup, args=(_warmup_state, years), name='warmup', daemon=True).start()
+        return _warmup_state